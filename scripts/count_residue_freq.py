@@ -36,6 +36,9 @@ def count_and_frequency(input_file, output_file):
 
         # Common amino acids plus the gap character
         amino_acids = "ACDEFGHIKLMNPQRSTVWY-X"
+        # frozenset for the per-residue membership test below: checking a set
+        # is O(1) instead of a substring scan of amino_acids for every residue
+        amino_acids_set = frozenset(amino_acids)
         # Reference sequence length
         ref_len = len(sequences[0])
 
@@ -50,7 +53,7 @@ def count_and_frequency(input_file, output_file):
             # If a sequence is shorter, only take up to ref_len
             for pos in range(ref_len):
                 aa = seq[pos] if pos < len(seq) else '-'
-                if aa in amino_acids:
+                if aa in amino_acids_set:
                     counts[aa][pos] += 1
 
         # Compute frequencies and find the highest-frequency amino acid
@@ -150,9 +153,10 @@ def transpose_and_pickmax(count_file, out_file):
         result_line = f"{tokens[0]}\t{tokens[45]}\t{max_val}%"
         result_lines.append(result_line)
 
-    with open(out_file, 'w') as fw:
-        for line in result_lines:
-            fw.write(line + "\n")
+    # One buffered binary write instead of one text-mode write per line
+    with open(out_file, 'wb') as fw:
+        if result_lines:
+            fw.write(("\n".join(result_lines) + "\n").encode())
 
 
 def main():
@@ -32,7 +32,8 @@ def parse_dssp(dssp_file, output_file):
         'UNK': 'X', 'XAA': 'X', 'XLE': 'J',
     }
 
-    with open(dssp_file, 'r') as dssp, open(output_file, 'w') as out:
+    rows = []
+    with open(dssp_file, 'r') as dssp:
         for line in dssp:
             # DSSP lines containing "nohd" typically have secondary structure data
             if line.startswith('nohd'):
@@ -67,7 +68,12 @@ def parse_dssp(dssp_file, output_file):
                 }
                 ss_simple = ss_map.get(ss, 'C')  # Default 'C' (Coil)
 
-                out.write(f"{res_num}\t{aa}\t{ss_simple}\n")
+                rows.append(f"{res_num}\t{aa}\t{ss_simple}")
+
+    # One buffered binary write instead of one text-mode write per residue
+    with open(output_file, 'wb') as out:
+        if rows:
+            out.write(('\n'.join(rows) + '\n').encode())
 
 def main():
     if len(sys.argv) != 3:
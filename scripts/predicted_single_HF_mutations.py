@@ -4,6 +4,7 @@
 import argparse
 import joblib
 import numpy as np
+import pandas as pd
 
 def parse_out_freq(freq_file):
     """
@@ -13,32 +14,21 @@ def parse_out_freq(freq_file):
     If highest_freq_aa == '-', it means a gap (kept as '-').
     Return list of (ref_aa, highest_freq_aa, freq_float).
     """
-    freq_data = []
-    with open(freq_file, 'r') as f:
-        lines = [line.strip() for line in f if line.strip()]
-
     # Skip header if it contains "Position:"
-    idx = 0
-    if lines and "Position:" in lines[0]:
-        idx = 1
-
-    for line in lines[idx:]:
-        parts = line.split()
-        if len(parts) < 3:
-            continue
-
-        ref_aa = parts[0]
-        highest_freq_aa = parts[1]  # could be '-', or actual AA
-        freq_str = parts[2].rstrip('%')  # e.g. "67.34%"
+    with open(freq_file, 'r') as f:
+        first_line = f.readline()
+    skip = 1 if "Position:" in first_line else 0
 
-        try:
-            freq_val = float(freq_str) / 100.0  # Convert percentage -> 0..1
-        except ValueError:
-            freq_val = 0.0
+    # Parse all columns in one C-engine pass instead of per-line Python splits
+    df = pd.read_csv(freq_file, sep=r'\s+', skiprows=skip, header=None,
+                     names=['ref', 'hfreq', 'pct'], dtype=str, engine='c')
+    df = df.dropna()
 
-        freq_data.append((ref_aa, highest_freq_aa, freq_val))
+    # e.g. "67.34%" -> 0.6734; unparseable values fall back to 0.0
+    freq_vals = pd.to_numeric(df['pct'].str.rstrip('%'),
+                              errors='coerce').fillna(0.0) / 100.0
 
-    return freq_data
+    return list(zip(df['ref'], df['hfreq'], freq_vals))
 
 
 def parse_out_txt(dssp_file):
@@ -47,71 +37,61 @@ def parse_out_txt(dssp_file):
     Each line: pos   ref_aa   SS
     Return list of (pos_int, ref_aa, SS).
     """
-    dssp_data = []
-    with open(dssp_file, 'r') as f:
-        for line in f:
-            parts = line.split()
-            if len(parts) < 3:
-                continue
-            try:
-                pos = int(parts[0])
-            except ValueError:
-                continue
-            ref_aa = parts[1]
-            ss = parts[2]
-            dssp_data.append((pos, ref_aa, ss))
-    return dssp_data
+    df = pd.read_csv(dssp_file, sep=r'\s+', header=None,
+                     names=['pos', 'ref', 'ss'], dtype=str, engine='c')
+    df = df.dropna()
+
+    # Drop rows whose position column is not an integer
+    pos = pd.to_numeric(df['pos'], errors='coerce')
+    df = df[pos.notna()]
+
+    return list(zip(pos[pos.notna()].astype(int), df['ref'], df['ss']))
 
 
 def merge_data(freq_data, dssp_data):
     """
     Merge freq_data & dssp_data, taking into account 'X' lines in freq_data.
 
-    We'll keep two indices:
-      i for freq_data
-      j for dssp_data
-
-    We'll also maintain an output pos_counter that increments for every line of freq_data.
-
-    - If freq_data[i].ref_aa == 'X':
-        -> This line does NOT consume dssp_data[j].
-        -> We'll produce (pos_counter, 'X', highest_freq_aa, freq_val, 'NA') in merged list.
-    - Else:
-        -> We consume one line from dssp_data[j].
-        -> Suppose dssp_data[j] = (pos_dssp, dssp_ref, ss).
-        -> We produce (pos_counter, dssp_ref, highest_freq_aa, freq_val, ss).
-        -> Then j += 1
-
-    i always goes from 0..(len(freq_data)-1)
-    j only advances when ref_aa != 'X'.
-
-    Return merged list of (pos_counter, ref_aa_final, highest_freq_aa, freq_val, ss).
+    A freq line with ref_aa == 'X' (unresolved region) does NOT consume a
+    DSSP line and gets ('X', ..., 'NA'); every other freq line is paired
+    with the next DSSP line in order, taking the DSSP residue as the final
+    reference. Instead of walking the two lists with advancing Python
+    pointers, compute the DSSP row consumed by each freq line as the
+    cumulative count of preceding non-'X' lines and gather the DSSP
+    columns in one vectorized pass.
+
+    Return a DataFrame with columns (pos, ref_aa, highest_freq_aa,
+    frequency, SS). Freq lines beyond the end of the DSSP data keep their
+    own ref_aa and get SS='NA'.
     """
-    merged = []
-    j = 0  # pointer for dssp_data
-    pos_counter = 1
-
-    for i in range(len(freq_data)):
-        ref_aa_freq, highest_freq_aa, freq_val = freq_data[i]
-
-        if ref_aa_freq == 'X':
-            # Unresolved region: we don't consume dssp_data
-            merged.append((pos_counter, 'X', highest_freq_aa, freq_val, 'NA'))
-            pos_counter += 1
-        else:
-            # We should consume one line from dssp_data (if available)
-            if j < len(dssp_data):
-                _, dssp_ref, ss = dssp_data[j]
-                # We decide to use dssp_ref as the final reference
-                merged.append((pos_counter, dssp_ref, highest_freq_aa, freq_val, ss))
-                j += 1
-            else:
-                # If there's no more dssp line, we can only store partial info
-                merged.append((pos_counter, ref_aa_freq, highest_freq_aa, freq_val, 'NA'))
-
-            pos_counter += 1
-
-    return merged
+    columns = ['pos', 'ref_aa', 'highest_freq_aa', 'frequency', 'SS']
+    if not freq_data:
+        return pd.DataFrame(columns=columns)
+
+    ref = np.array([r for (r, _, _) in freq_data])
+    hfreq = np.array([h for (_, h, _) in freq_data])
+    freq_val = np.array([v for (_, _, v) in freq_data], dtype=float)
+    dssp_ref = np.array([r for (_, r, _) in dssp_data])
+    ss = np.array([s for (_, _, s) in dssp_data])
+
+    isX = ref == 'X'
+    j = np.cumsum(~isX) - 1  # DSSP row consumed by each non-'X' freq line
+    have_dssp = ~isX & (j < len(dssp_data))
+    if len(dssp_data) == 0:
+        # placeholders so the gather below stays well-defined
+        dssp_ref, ss = np.array(['-']), np.array(['NA'])
+    j_safe = np.clip(j, 0, len(dssp_ref) - 1)
+
+    final_ref = np.where(have_dssp, dssp_ref[j_safe], ref)
+    final_ss = np.where(have_dssp, ss[j_safe], 'NA')
+
+    return pd.DataFrame({
+        'pos': np.arange(1, len(freq_data) + 1),
+        'ref_aa': final_ref,
+        'highest_freq_aa': hfreq,
+        'frequency': freq_val,
+        'SS': final_ss,
+    })
 
 
 def round_to_0_1_increment(x):
@@ -153,7 +133,7 @@ def main():
     dssp_data = parse_out_txt(args.dssp)
 
     # 3) Merge
-    merged_list = merge_data(freq_data, dssp_data)
+    merged_df = merge_data(freq_data, dssp_data)
 
     # 4) Determine beta, gama either from user or auto-model
     beta = args.beta
@@ -165,15 +145,10 @@ def main():
         model_b_path = f"{args.model_path}/best_model_b.pkl"  # for predicting gama
         scaler_path  = f"{args.model_path}/scaler.pkl"
 
-        # from the dssp file => protein_size, flex_ratio
-        with open(args.dssp, 'r') as f:
-            lines = [l.strip() for l in f if l.strip()]
-        protein_size = len(lines)
-        c_count = 0
-        for line in lines:
-            parts = line.split()
-            if len(parts) >= 3 and parts[2] == 'C':
-                c_count += 1
+        # protein_size, flex_ratio from the already-parsed dssp data,
+        # avoiding a second pass over the file
+        protein_size = len(dssp_data)
+        c_count = sum(1 for (_, _, ss) in dssp_data if ss == 'C')
         flex_ratio = c_count / protein_size if protein_size > 0 else 0.0
 
         # load models
@@ -205,37 +180,22 @@ def main():
 
     print(f"[INFO] Final beta={beta}, gama={gama}")
 
-    # 5) Write combined file
-    with open(args.comb, 'w') as fout:
-        fout.write("pos\tref_aa\thighest_freq_aa\tfrequency\tSS\n")
-        for (pos_counter, ref_aa, hfreq_aa, freq_val, ss) in merged_list:
-            fout.write(f"{pos_counter}\t{ref_aa}\t{hfreq_aa}\t{freq_val:.4f}\t{ss}\n")
-
-    # 6) Filter by beta/gama
-    filtered_set = set()
-
-    for (pos_counter, ref_aa, hfreq_aa, freq_val, ss) in merged_list:
-        if ref_aa == 'X':
-            continue
-
-        # Must differ from ref_aa, and freq_val >= threshold
-        if ref_aa != hfreq_aa:
-            if ss == 'C':
-                # coil => use gama
-                if freq_val >= gama:
-                    filtered_set.add((pos_counter, ref_aa, hfreq_aa, freq_val, ss))
-            else:
-                # non-coil => use beta
-                if freq_val >= beta:
-                    filtered_set.add((pos_counter, ref_aa, hfreq_aa, freq_val, ss))
+    # 5) Write combined file in one shot
+    merged_df.to_csv(args.comb, sep='\t', index=False, float_format='%.4f')
 
-    filtered_list = sorted(filtered_set, key=lambda x: x[0])
+    # 6) Filter by beta/gama with a single boolean mask: the mutation must
+    #    differ from the reference, and pass the coil (gama) or non-coil
+    #    (beta) frequency threshold. The merged rows are unique and already
+    #    in position order, so no set/sort pass is needed.
+    ref = merged_df['ref_aa'].to_numpy()
+    hfreq = merged_df['highest_freq_aa'].to_numpy()
+    freq = merged_df['frequency'].to_numpy()
+    ss = merged_df['SS'].to_numpy()
+    mask = (ref != 'X') & (ref != hfreq) & \
+           np.where(ss == 'C', freq >= gama, freq >= beta)
 
     # 7) Write filtered file
-    with open(args.mut, 'w') as fout:
-        fout.write("pos\tref_aa\thighest_freq_aa\tfrequency\tSS\n")
-        for (pos_counter, ref_aa, hfreq_aa, freq_val, ss) in filtered_list:
-            fout.write(f"{pos_counter}\t{ref_aa}\t{hfreq_aa}\t{freq_val:.4f}\t{ss}\n")
+    merged_df[mask].to_csv(args.mut, sep='\t', index=False, float_format='%.4f')
 
     print(f"[INFO] Combined file saved to {args.comb}")
     print(f"[INFO] Filtered mutations saved to {args.mut}")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Numba-accelerated kernels for the pySCA scripts.
+
+The kernels operate on uint8 buffers (obtained with np.frombuffer on the
+joined alignment strings) together with 256-entry ASCII lookup tables, so
+the hot per-residue loops compile down to simple array scans. If numba is
+not installed, the kernels fall back to equivalent vectorized NumPy code.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+# 256-entry lookup table translating the ASCII codes of the 20 standard
+# amino acids to the numbers 1,...,20 used by scaTools.lett2num (any other
+# character maps to 0).
+AA_LUT = np.zeros(256, dtype=np.int8)
+for _i, _aa in enumerate('ACDEFGHIKLMNPQRSTVWY'):
+    AA_LUT[ord(_aa)] = _i + 1
+
+GAP = ord('-')
+
+# 256-entry boolean mask of the characters allowed in a processed alignment
+# (the 20 standard amino acids plus the gap), shared by the filtering scripts
+# so the mask is built exactly once per process.
+ALLOWED_AA = AA_LUT > 0
+ALLOWED_AA[GAP] = True
+
+if HAS_NUMBA:
+    @njit(cache=True, nogil=True)
+    def lett2num_nb(buf, lut):
+        out = np.empty(buf.shape, np.int8)
+        for i in range(buf.shape[0]):
+            for j in range(buf.shape[1]):
+                out[i, j] = lut[buf[i, j]]
+        return out
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def gap_frac_seq_nb(arr, gap):
+        M, L = arr.shape
+        out = np.empty(M, np.float64)
+        for i in prange(M):
+            c = 0
+            for j in range(L):
+                if arr[i, j] == gap:
+                    c += 1
+            out[i] = c / L
+        return out
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def gap_frac_pos_nb(arr, seqwn, gap):
+        M, L = arr.shape
+        out = np.empty(L, np.float64)
+        for j in prange(L):
+            s = 0.0
+            for i in range(M):
+                if arr[i, j] == gap:
+                    s += seqwn[i]
+            out[j] = s
+        return out
+
+    # Warm the JITs once at import so the compilation cost is not paid
+    # inside the processing loop of the calling script.
+    _tiny = np.zeros((1, 1), dtype=np.uint8)
+    lett2num_nb(_tiny, AA_LUT)
+    gap_frac_seq_nb(_tiny, GAP)
+    gap_frac_pos_nb(_tiny, np.ones(1), GAP)
+else:
+    def lett2num_nb(buf, lut):
+        return lut[buf]
+
+    def gap_frac_seq_nb(arr, gap):
+        return (arr == gap).mean(axis=1)
+
+    def gap_frac_pos_nb(arr, seqwn, gap):
+        return seqwn.dot(arr == gap)
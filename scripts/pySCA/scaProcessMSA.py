@@ -55,6 +55,7 @@ import numpy as np
 import copy
 import scipy.cluster.hierarchy as sch
 import scaTools as sca
+from _fast import lett2num_nb, AA_LUT, ALLOWED_AA
 import pickle
 import argparse
 from Bio import SeqIO
@@ -108,24 +109,17 @@ if __name__ =='__main__':
         i_ref = options.i_ref
 
     # Read in initial alignment
-    headers_full, sequences_full = sca.readAlg(options.alignment)
+    headers_full, sequences_full = sca.readAlg_mmap(options.alignment)
     print('Loaded alignment of %i sequences, %i positions.' % (len(headers_full), len(sequences_full[0])))
 
     # Check the alignment and remove sequences containing non-standard amino acids
     print("Checking alignment for non-standard amino acids")
-    alg_out = []
-    hd_out = []
-    for i,k in enumerate(sequences_full):
-        flag=0
-        for aa in k:
-            if aa not in 'ACDEFGHIKLMNPQRSTVWY-':
-                flag = 1
-                break
-        if flag ==0:
-            alg_out.append(k)
-            hd_out.append(headers_full[i])
-    headers_full = hd_out
-    sequences_full = alg_out
+    Npos_full = len(sequences_full[0])
+    algbuf = np.frombuffer(''.join(sequences_full).encode('latin-1'),
+                           dtype=np.uint8).reshape(len(sequences_full), Npos_full)
+    seqkeep_std = np.nonzero(ALLOWED_AA[algbuf].all(axis=1))[0]
+    headers_full = [headers_full[i] for i in seqkeep_std]
+    sequences_full = [sequences_full[i] for i in seqkeep_std]
     print("Alignment size after removing sequences with non-standard amino acids: %i" % (len(sequences_full)))
 
     # Do an initial trimming to remove excessively gapped positions - positions with 80% or more gaps
@@ -167,17 +161,11 @@ if __name__ =='__main__':
                         sys.exit("Error!!  Can't find reference sequence...")
                 # Now build ATS
                 sequences, ats = sca.makeATS(sequences_full, ats_pdb, seq_pdb, i_ref, options.truncate)
-                dist_new = np.zeros((len(ats), len(ats)))
-                for (j,pos1) in enumerate(ats):
-                    for (k,pos2) in enumerate(ats):
-                        if k!=j:
-                            if (pos1 == '-') or (pos2 == '-'):
-                                dist_new[j,k] = 1000
-                            else:
-                                ix_j = ats_pdb.index(pos1)
-                                ix_k = ats_pdb.index(pos2)
-                                dist_new[j,k] = dist_pdb[ix_j,ix_k]
-                dist_pdb = dist_new
+                # Map each ats position into the raw PDB distance matrix once;
+                # the actual gather is deferred until after position filtering
+                # so the remapped matrix is only materialized a single time.
+                pos_to_idx = {pos:ix for (ix,pos) in enumerate(ats_pdb)}
+                ats_idx = np.array([pos_to_idx.get(pos, -1) for pos in ats])
             except:
                 sys.exit("Error!!! Something wrong with PDBid or path...")
         elif options.refseq is not None:
@@ -193,10 +181,10 @@ if __name__ =='__main__':
                             ats_tmp = [line.rstrip('\n') for line in f]
                     except:
                         print("Error reading reference position file! Using default numbering 1..N")
-                        ats_tmp = range(len(sequences_full[0]))
+                        ats_tmp = np.arange(len(sequences_full[0]), dtype=np.int32)
                 else:
                     print("No reference position list provided.  Using default numbering 1..N")
-                    ats_tmp = range(len(sequences_full[0]))
+                    ats_tmp = np.arange(len(sequences_full[0]), dtype=np.int32)
                 sequences, ats = sca.makeATS(sequences_full, ats_tmp, s_tmp[0], i_ref, options.truncate)
             except:
                 sys.exit("Error!!  Can't find reference sequence...")
@@ -205,7 +193,7 @@ if __name__ =='__main__':
             i_ref = sca.chooseRefSeq(sequences_full)
             print("No reference sequence given, chose as default (%i): %s" % (i_ref, headers_full[i_ref]))
             sequences = sequences_full
-            ats = range(len(sequences[0]))
+            ats = np.arange(len(sequences[0]), dtype=np.int32)
     else:
         # user explicitly gave i_ref
         print("using provided reference index %i" % (i_ref))
@@ -216,7 +204,7 @@ if __name__ =='__main__':
                 with open(options.refpos,'r') as f:
                     ats_tmp = [line.rstrip('\n') for line in f]
             else:
-                ats_tmp = range(len(sequences_ori[0]))
+                ats_tmp = np.arange(len(sequences_ori[0]), dtype=np.int32)
             sequences, ats = sca.makeATS(sequences_full, ats_tmp, s_tmp, i_ref, options.truncate)
         except:
             sys.exit("Error!!  Can't find reference sequence...")
@@ -230,24 +218,27 @@ if __name__ =='__main__':
     except:
         print("ATS should also have %i positions - ATS: %i" % (len(sequences[0]), len(ats)))
 
-    if i_ref is not None:
-        alg0, seqw0, seqkeep = sca.filterSeq(sequences, i_ref,
-                                             max_fracgaps=options.parameters[1],
-                                             min_seqid=options.parameters[2],
-                                             max_seqid=options.parameters[3])
-    else:
-        alg0, seqw0, seqkeep = sca.filterSeq(sequences,
-                                             max_fracgaps=options.parameters[1],
-                                             min_seqid=options.parameters[2],
-                                             max_seqid=options.parameters[3])
+    # Every reference-selection path above either sets i_ref or exits, so a
+    # single filterSeq call with the reference index covers all cases.
+    assert i_ref is not None
+    alg0, seqw0, seqkeep = sca.filterSeq(sequences, i_ref,
+                                         max_fracgaps=options.parameters[1],
+                                         min_seqid=options.parameters[2],
+                                         max_seqid=options.parameters[3])
 
     headers = [headers_full[s] for s in seqkeep]
     alg1, iposkeep = sca.filterPos(alg0, seqw0, options.parameters[0])
-    ats = [ats[i] for i in iposkeep]
+    ats = np.asarray(ats)[iposkeep]
 
     try:
         dist_pdb
-        distmat = dist_pdb[np.ix_(iposkeep, iposkeep)]
+        # One gather from the raw PDB matrix for the retained positions;
+        # positions without a structure mapping get the 1000 placeholder.
+        keep_idx = ats_idx[iposkeep]
+        valid = keep_idx >= 0
+        distmat = np.full((len(keep_idx), len(keep_idx)), 1000.0)
+        distmat[np.ix_(valid, valid)] = dist_pdb[np.ix_(keep_idx[valid], keep_idx[valid])]
+        np.fill_diagonal(distmat, 0)
     except:
         distmat = None
 
@@ -258,7 +249,8 @@ if __name__ =='__main__':
 
     # Limitation of total sequences to [1.5 * # of effective sequences] if Nselect is set to True
     if (options.Nselect):
-        seqsel = sca.randSel(seqw0, int(1.5 * effseqsprelimit), [seqkeep.index(i_ref)] if i_ref in seqkeep else [])
+        seqkeep_pos = {s:i for (i,s) in enumerate(seqkeep)}
+        seqsel = sca.randSel(seqw0, int(1.5 * effseqsprelimit), [seqkeep_pos[i_ref]] if i_ref in seqkeep_pos else [])
         alg = [alg1[s] for s in seqsel]
         hd = [headers[s] for s in seqsel]
     else:
@@ -268,7 +260,9 @@ if __name__ =='__main__':
     # Calculation of final MSA, sequence weights
     seqw = sca.seqWeights(alg)
     effseqs = seqw.sum()
-    msa_num = sca.lett2num(alg)
+    algarr = np.frombuffer(''.join(alg).encode('latin-1'),
+                           dtype=np.uint8).reshape(len(alg), -1)
+    msa_num = lett2num_nb(algarr, AA_LUT)
     Nseq, Npos = msa_num.shape
     print("Final alignment parameters:")
     print("Number of sequences: M = %i" % (Nseq))
@@ -292,15 +286,22 @@ if __name__ =='__main__':
 
     # Write final processed alignment to FASTA
     final_fasta_path = os.path.join(out_dir, fn_noext + "processed.fasta")
+    # Buffer the records and write in chunks to keep the number of write
+    # calls (and Python-level formatting passes) small without holding a
+    # second copy of a very large alignment in memory.
     with open(final_fasta_path, "w") as f:
-        for i in range(len(alg)):
-            f.write(">%s\n" % hd[i])
-            f.write(alg[i] + "\n")
+        chunk = 10000
+        for i in range(0, len(alg), chunk):
+            f.write(''.join(">%s\n%s\n" % (h, s)
+                            for (h, s) in zip(hd[i:i+chunk], alg[i:i+chunk])))
 
     D = {}
     D['alg'] = alg
+    # also store the alignment as its uint8 matrix - a single contiguous
+    # buffer pickles much faster than the list of per-sequence strings
+    D['alg_u8'] = algarr
     D['hd'] = hd
-    D['msa_num'] = msa_num
+    D['msa_num'] = np.ascontiguousarray(msa_num, dtype=np.int8)
     D['seqw'] = seqw
     D['Nseq'] = Nseq
     D['Npos'] = Npos
@@ -332,7 +333,7 @@ if __name__ =='__main__':
     # Finally, pickle the db dictionary
     db_path = os.path.join(out_dir, fn_noext + ".db")
     with open(db_path, "wb") as fdb:
-        pickle.dump(db, fdb)
+        pickle.dump(db, fdb, protocol=pickle.HIGHEST_PROTOCOL)
 
     print("All files written to: %s" % out_dir)
     print("FASTA: %s" % final_fasta_path)
@@ -19,8 +19,10 @@ import os
 import subprocess
 import copy
 import time
+import mmap
 import numpy as np
 import random as rand
+from _fast import gap_frac_seq_nb, gap_frac_pos_nb, GAP
 import scipy.sparse
 import scipy.sparse.linalg
 from scipy.sparse import csr_matrix as sparsify
@@ -109,6 +111,34 @@ def readAlg(filename):
     sequences.append(seq.replace('\n','').upper())
     return headers, sequences
 
+def readAlg_mmap(filename):
+    ''' Read in a multiple sequence alignment in fasta format through a memory
+    map: record starts are located with one vectorized scan for '>' characters
+    at line starts, and each record is sliced out of the map directly, avoiding
+    both the full-file read and the per-line Python loop of readAlg_. Returns
+    the same (headers, sequences) pair.
+
+    .. _readAlg: scaTools.html#scaTools.readAlg
+
+    >>> headers, sequences = readAlg_mmap(filename) '''
+    headers = list(); sequences = list()
+    with open(filename, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        gt = np.nonzero(buf == ord('>'))[0]
+        # keep only '>' at the start of the file or of a line:
+        starts = gt[(gt == 0) | (buf[np.maximum(gt - 1, 0)] == ord('\n'))]
+        bounds = list(starts) + [len(buf)]
+        for k in range(len(starts)):
+            rec = mm[bounds[k]:bounds[k+1]]
+            eol = rec.find(b'\n')
+            if eol == -1: eol = len(rec)
+            headers.append(rec[1:eol].rstrip(b'\r').decode('latin-1'))
+            sequences.append(rec[eol+1:].translate(None, b'\n\r ').decode('latin-1').upper())
+        del buf
+        mm.close()
+    return headers, sequences
+
 def AnnotPfam(pfam_in, pfam_out, pfam_seq=path2pfamseq):
     ''' Phylogenetic annotation of a Pfam alignment (in fasta format) using information from pfamseq.txt. The output is a fasta file containing phylogenetic annotations in the header (to be parsed with '|' as a delimiter).
     
@@ -242,7 +272,7 @@ def MSAsearch(hd, algn, seq, species = None, path2_algprog=path2needle):
             for k in algres:
                 if (k.find('Identity: ') > 0):
                     score.append(int(k.split()[2].split('/')[0]))
-            i_0 = score.index(max(score))
+            i_0 = int(np.argmax(score))
             if species is not None:
                 strseqnum = key_list[i_0]
             else:
@@ -254,7 +284,7 @@ def MSAsearch(hd, algn, seq, species = None, path2_algprog=path2needle):
             score = list()
             for k,s in enumerate(algn):
                 score.append(pairwise2.align.globalxx(algn, s, one_alignment_only=1, score_only=1))
-            i_0 = score.index(max(score)) 
+            i_0 = int(np.argmax(score)) 
             if species is not None:
                 strseqnum = key_list[i_0]
             else:
@@ -413,11 +443,35 @@ def seqWeights(alg, max_seqid=.8, gaps=1):
     codeaa = 'ACDEFGHIKLMNPQRSTVWY'
     if gaps == 1: codeaa += '-'
     msa_num = lett2num(alg, code=codeaa)
-    X2d = alg2bin(msa_num, N_aa=len(codeaa) )
-    simMat = (X2d.dot(X2d.T)).todense()/msa_num.shape[1]
-    seqw = np.array(1/(simMat>max_seqid).sum(axis=0))
+    Npos = msa_num.shape[1]
+    # Duplicate sequences share the same neighborhood, so the similarity
+    # matrix only needs the unique rows; counts map the result back.
+    uniq, inverse, counts = np.unique(msa_num, axis=0,
+                                      return_inverse=True, return_counts=True)
+    # One-hot encode (class 0 = non-code characters, which never match) so
+    # that pairwise identity counts become a single float32 matrix product,
+    # computed in blocks of rows to bound memory:
+    onehot = np.eye(len(codeaa) + 1, dtype=np.float32)
+    onehot[0] = 0
+    X = onehot[uniq].reshape(len(uniq), -1)
+    nneighbors = np.zeros(len(uniq))
+    block = 4096
+    for i in range(0, len(uniq), block):
+        simMat = X[i:i+block].dot(X.T)/Npos
+        nneighbors[i:i+block] = (simMat > max_seqid).dot(counts)
+    seqw = (1/nneighbors[inverse]).reshape(1, -1)
     return seqw
 
+def alg2u8(alg):
+    ''' Convert an alignment (list of sequences) to a Nseq x Npos uint8 array of
+    ASCII codes, so that per-residue operations (gap counting, identity to a
+    reference) can be carried out as vectorized NumPy passes over bytes.
+
+    :Example:
+       >>> algmat = alg2u8(alg) '''
+    return np.frombuffer(''.join(alg).encode('latin-1'),
+                         dtype=np.uint8).reshape(len(alg), -1)
+
 def filterSeq(alg0, sref=0.5, max_fracgaps=.2, min_seqid=.2, max_seqid=.8):
     ''' Take in an alignment (alg0, assumed to be filtered to remove highly gapped positions),
     a reference sequence, the maximum fraction of gaps allowed per sequence (max_fracgaps),
@@ -436,17 +490,17 @@ def filterSeq(alg0, sref=0.5, max_fracgaps=.2, min_seqid=.2, max_seqid=.8):
     
     '''
     if (sref == 0.5): sref = chooseRefSeq(alg0)
-    Nseq, Npos = len(alg0), len(alg0[0])    
+    Nseq, Npos = len(alg0), len(alg0[0])
+    algmat = alg2u8(alg0)
     # Elimination of sequences with too many gaps:
-    seqkeep0 = [s for s in range(Nseq) if alg0[s].count('-')/Npos < max_fracgaps]
-    print ("Keeping %i sequences of %i sequences (after filtering for gaps)"% (len(seqkeep0), Nseq))
+    gapkeep = gap_frac_seq_nb(algmat, GAP) < max_fracgaps
+    print ("Keeping %i sequences of %i sequences (after filtering for gaps)"% (gapkeep.sum(), Nseq))
     # Elimination of sequences too dissimilar to the reference (trimming):
-    seqkeep = [s for s in seqkeep0 \
-               if sum([alg0[s][i] == alg0[sref][i] for i in range(Npos)])/Npos > min_seqid]
-    print ("Keeping %i sequences of %i sequences (after filtering for seq similarity)"% (len(seqkeep), len(seqkeep0)))
+    seqid = (algmat == algmat[sref]).mean(axis=1)
+    seqkeep = np.nonzero(gapkeep & (seqid > min_seqid))[0].tolist()
+    print ("Keeping %i sequences of %i sequences (after filtering for seq similarity)"% (len(seqkeep), gapkeep.sum()))
     alg = [alg0[s] for s in seqkeep]
     # Sequence weights (smoothing, here effectively treats gaps as a 21st amino acid):
-    msa_num = lett2num(alg)
     seqw = seqWeights(alg, max_seqid)
     return alg, seqw, seqkeep
     
@@ -471,14 +525,14 @@ def filterPos(alg, seqw=[1], max_fracgaps=.2):
     Nseq, Npos = len(alg), len(alg[0])
     if len(seqw) == 1: seqw = np.tile(1, (1, Nseq))
     # Fraction of gaps, taking into account sequence weights:
-    gapsMat = np.array([[int(alg[s][i]=='-') for i in range(Npos)] for s in range(Nseq)])
-    seqwn = seqw/seqw.sum()
-    gapsperpos = seqwn.dot(gapsMat)[0]
+    algmat = alg2u8(alg)
+    seqwn = np.asarray(seqw/seqw.sum(), dtype=np.float64).ravel()
+    gapsperpos = gap_frac_pos_nb(algmat, seqwn, GAP)
     # Selected positions:
-    selpos = [i for i in range(Npos) if gapsperpos[i] < max_fracgaps]
+    selpos = np.nonzero(gapsperpos < max_fracgaps)[0].tolist()
     # Truncation:
-    alg_tr = [''.join([alg[s][i] for i in selpos]) for s in range(Nseq)]
-    return alg_tr, selpos     
+    alg_tr = [row.tobytes().decode('latin-1') for row in algmat[:, selpos]]
+    return alg_tr, selpos
 
 def randSel(seqw, Mtot, keepSeq = []):
     ''' Random selection of Mtot sequences, drawn with weights and without replacement.